@@ -0,0 +1,54 @@
+"""
+Schema do personagem e configurações de geração do Gemini.
+- Ficam fora da página porque o st.navigation reexecuta o corpo dela a cada rerun; aqui são
+  montados uma única vez, na primeira importação, e compartilhados também pelas threads de segundo plano.
+"""
+from google.genai import types
+from pydantic import BaseModel, Field, TypeAdapter
+
+# Limites de tokens de saída. No gemini-2.5-flash os tokens de raciocínio também contam
+# nesse limite, por isso há folga além do tamanho esperado do texto final.
+MAX_TOKENS_PERSONAGEM = 2048
+MAX_TOKENS_CHAT = 1024
+
+# Quantidade de personagens gerados em uma única chamada, em segundo plano, para os próximos jogos
+TAMANHO_POOL = 5
+
+
+# --- DEFINIÇÃO DO SCHEMA (ESTRUTURA) DO PERSONAGEM ---
+
+class Personagem(BaseModel):
+    """
+    Schema para estruturar os dados do personagem gerado pela IA.
+    """
+    # Descrições curtas: o schema é enviado junto com cada chamada de geração.
+    # As instruções detalhadas de cada campo ficam no PROMPT_GERADOR.
+    personagem: str = Field(description="Nome completo.")
+    descricao: str = Field(description="Biografia detalhada, sem o nome.")
+    estilo: str = Field(description="Estilo de fala, sucinto.")
+    saudacao: str = Field(description="Saudação curta e genérica, sem pistas da identidade.")
+
+# Validador do lote de personagens (schema list[Personagem])
+LISTA_PERSONAGENS = TypeAdapter(list[Personagem])
+
+# Passados em response_json_schema, os JSON schemas seguem para a API como estão;
+# com response_schema=Personagem, o SDK refaria a tradução do modelo Pydantic a cada chamada.
+SCHEMA_PERSONAGEM = Personagem.model_json_schema()
+SCHEMA_LISTA_PERSONAGENS = LISTA_PERSONAGENS.json_schema()
+
+
+# --- CONFIGURAÇÕES DE GERAÇÃO (compartilhadas por todas as chamadas) ---
+
+CONFIG_PERSONAGEM = types.GenerateContentConfig(
+    response_mime_type='application/json',
+    response_json_schema=SCHEMA_PERSONAGEM,
+    max_output_tokens=MAX_TOKENS_PERSONAGEM,
+    temperature=0.9,
+)
+CONFIG_POOL = types.GenerateContentConfig(
+    response_mime_type='application/json',
+    response_json_schema=SCHEMA_LISTA_PERSONAGENS,
+    max_output_tokens=MAX_TOKENS_PERSONAGEM * TAMANHO_POOL,
+    temperature=0.9,
+)
+CONFIG_RESUMO = types.GenerateContentConfig(max_output_tokens=MAX_TOKENS_CHAT)
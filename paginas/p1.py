@@ -1,114 +1,390 @@
 import streamlit as st
-import google.generativeai as genai
-from pydantic import BaseModel, Field
-import json
+from google import genai
+from google.genai import errors, types
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import logging
+import re
+import threading
+
+from paginas.config_gemini import (
+    CONFIG_PERSONAGEM,
+    CONFIG_POOL,
+    CONFIG_RESUMO,
+    LISTA_PERSONAGENS,
+    MAX_TOKENS_CHAT,
+    TAMANHO_POOL,
+    Personagem,
+)
+
+logger = logging.getLogger(__name__)
 
 # --- CONFIGURAÇÃO DA PÁGINA E API DO GOOGLE ---
 
 st.set_page_config(layout="wide", page_title="🕵️ Quem Sou Eu?")
 
+# Tempo, em segundos, que uma conexão ociosa com a API fica aberta. O padrão do httpx (5 s) é menor
+# que o tempo que o jogador leva para pensar, e cada pergunta pagaria um novo handshake TCP+TLS.
+KEEPALIVE_CONEXAO = 300
+
+@st.cache_resource
+def get_client():
+    """
+    Cliente do SDK google-genai, criado uma única vez por processo.
+    - Compartilhado entre reruns, sessões e as threads de segundo plano, reaproveitando as conexões abertas.
+    - HTTP/2 multiplexa as chamadas simultâneas (chat e lotes em segundo plano) em uma só conexão,
+      mantida aberta por KEEPALIVE_CONEXAO entre as perguntas.
+    """
+    return genai.Client(
+        api_key=st.secrets["GOOGLE_API_KEY"],
+        http_options=types.HttpOptions(
+            client_args={
+                "http2": True,
+                "limits": httpx.Limits(max_keepalive_connections=20, keepalive_expiry=KEEPALIVE_CONEXAO),
+            },
+        ),
+    )
+
 # Carrega a chave da API a partir dos segredos do Streamlit de forma segura
 try:
-    genai.configure(api_key=st.secrets["GOOGLE_API_KEY"])
+    get_client()
 except (KeyError, FileNotFoundError):
     st.error("Chave da API do Google (GOOGLE_API_KEY) não encontrada. Por favor, configure-a nos segredos do seu app no Streamlit Cloud.")
     st.stop()
 
 
-# --- DEFINIÇÃO DO SCHEMA (ESTRUTURA) DO PERSONAGEM ---
+# Modelo usado tanto para gerar o personagem quanto para o chat
+MODELO = "gemini-2.5-flash"
+
+# Acima de LIMITE_HISTORICO mensagens, o histórico do chat é compactado: as antigas viram um
+# resumo e só as JANELA_HISTORICO mais recentes (número par: pergunta + resposta) seguem literais
+LIMITE_HISTORICO = 12
+JANELA_HISTORICO = 6
+
+# Quantidade máxima de mensagens desenhadas na tela a cada rerun
+MAX_MENSAGENS_EXIBIDAS = 40
+
+# Rótulo de quem enviou cada mensagem antiga, no bloco único do histórico exibido
+ROTULOS = {"user": "🧑 **Você**", "assistant": "🕵️ **Personagem**"}
+
+# Construções de bloco que, no st.markdown único das mensagens antigas, vazariam para as mensagens
+# seguintes: cercas de código (fechadas se ficarem abertas) e títulos ou tabelas no início da linha
+CERCA_CODIGO = re.compile(r"^ {0,3}(`{3,}|~{3,})", re.MULTILINE)
+INICIO_BLOCO = re.compile(r"^( {0,3})([#|])", re.MULTILINE)
 
-class Personagem(BaseModel):
-    """
-    Schema para estruturar os dados do personagem gerado pela IA.
-    """
-    personagem: str = Field(description="O nome completo da persona.")
-    descricao: str = Field(description="Um ou mais parágrafos detalhados com informações biográficas, características e feitos notáveis, SEM revelar o nome.")
-    estilo: str = Field(description="Uma descrição sucinta do estilo de comunicação da persona (ex: 'Formal e enigmático', 'Alegre e um pouco caótico').")
-    # A instrução foi reforçada para garantir que a saudação seja neutra
-    saudacao: str = Field(description="Uma frase curta de saudação que a persona diria. A saudação DEVE SER genérica e NÃO PODE conter nomes, títulos ou referências óbvias que revelem a identidade.")
 
 # --- PROMPT PARA GERAR O PERSONAGEM (REFORÇADO) ---
 
+# Todo o texto fixo vem primeiro e a lista de exclusão fica no final, para que o prefixo
+# seja idêntico entre chamadas e aproveite o cache de prefixo do provedor.
 PROMPT_GERADOR = """
 # Papel e Objetivo
 Você é um roteirista para um jogo de adivinhação. Sua missão é escolher secretamente uma figura (histórica, famosa ou fictícia) e criar seus dados.
-**REGRA CRÍTICA:** O personagem escolhido NÃO PODE estar na lista de exclusão: {lista_geracao}
 
 Sua resposta DEVE ser um JSON com os seguintes campos:
 - "personagem": Nome completo do personagem.
 - "descricao": Narrativa sobre a persona, com feitos e características, mas SEM revelar o nome.
 - "estilo": O estilo de comunicação da persona.
 - "saudacao": Uma saudação inicial. **IMPORTANTE: A saudação precisa ser genérica e não pode entregar a identidade do personagem de forma alguma. Evite nomes, títulos ou jargões muito específicos.**
+
+**REGRA CRÍTICA:** O personagem escolhido NÃO PODE estar na lista de exclusão abaixo.
+---
+Lista de exclusão: """
+
+# Complemento do PROMPT_GERADOR para gerar vários personagens em uma única chamada
+PROMPT_LOTE = """
+
+Gere {quantidade} personagens diferentes entre si, como uma lista JSON de objetos com os campos acima.
+"""
+
+# --- PROMPT DA PERSONA (INSTRUÇÃO DE SISTEMA) ---
+
+# Preenchido com os campos do Personagem a cada jogo. Identidade e regras ficam juntas na
+# instrução de sistema, e não no histórico, para o modelo não tratá-las como fala do jogador.
+# O texto fixo vem primeiro e os dados da persona no final, mantendo o prefixo igual entre jogos.
+PROMPT_PERSONA = """
+### Contexto do Jogo
+Você está interpretando uma persona secreta em um jogo de adivinhação.
+
+### Regras Cruciais
+1. **NUNCA REVELE A IDENTIDADE**: Seja evasivo a perguntas diretas.
+2. **DÊ PISTAS INDIRETAS**: Responda sempre sob a perspectiva da sua persona.
+3. **SEJA O PERSONAGEM**: Incorpore a personalidade definida.
+4. **GERENCIE PALPITES**: Se o usuário errar, negue sutilmente. Se acertar, confirme de forma criativa.
+5. **SEJA BREVE**: Responda em no máximo 80 tokens (duas ou três frases curtas).
+
+**Comece o jogo APENAS com a sua saudação definida.**
+
+### Persona
+- Identidade Secreta: {personagem}
+- Biografia (para sua consulta, não para recitar): {descricao}
+- Estilo de Comunicação: {estilo}
+"""
+
+# --- PROMPT PARA RESUMIR O HISTÓRICO DO CHAT ---
+
+PROMPT_RESUMO = """
+Resuma em no máximo 80 tokens a conversa abaixo, de um jogo de adivinhação.
+Preserve as pistas que a persona já deu e os palpites que o jogador já fez.
+---
 """
 
 # --- FUNÇÕES OTIMIZADAS DO JOGO ---
 
-@st.cache_data(show_spinner="Gerando um novo personagem...")
-def gerar_novo_personagem(lista_a_evitar):
+def get_token_stats():
+    """
+    Contadores de tokens das chamadas ao Gemini feitas por esta sessão, em st.session_state.token_stats.
+    - Protegidos por um lock, pois as gerações em segundo plano também os atualizam.
+    """
+    if "token_stats" not in st.session_state:
+        st.session_state.token_stats = (threading.Lock(), {"prompt": 0, "cached": 0, "output": 0})
+    return st.session_state.token_stats
+
+def registrar_uso(resposta, token_stats=None):
+    """
+    Soma o usage_metadata de uma resposta do Gemini aos contadores de tokens.
+    - Fora da thread do script não há acesso ao st.session_state; quem roda em segundo plano
+      recebe o `token_stats` (de get_token_stats) já resolvido e o repassa aqui.
+    """
+    uso = resposta.usage_metadata
+    if uso is None:
+        return
+    lock, stats = token_stats or get_token_stats()
+    with lock:
+        # Campos sem valor vêm como None (ex.: cached_content_token_count sem cache)
+        stats["prompt"] += uso.prompt_token_count or 0
+        stats["cached"] += uso.cached_content_token_count or 0
+        stats["output"] += uso.candidates_token_count or 0
+
+def iniciar_personagens_usados():
+    """
+    Cria, se ainda não existirem, a lista de personagens usados e a mesma lista já unida
+    em texto ("A, B, C"), que é a forma usada nos prompts de geração.
+    """
+    st.session_state.setdefault("personagens_usados", [])
+    st.session_state.setdefault("personagens_usados_juntos", "")
+
+def registrar_personagem_usado(nome):
+    """
+    Adiciona o nome à lista de usados e acrescenta-o ao texto já unido, sem refazer o join.
+    """
+    st.session_state.personagens_usados.append(nome)
+    juntos = st.session_state.personagens_usados_juntos
+    st.session_state.personagens_usados_juntos = f"{juntos}, {nome}" if juntos else nome
+
+def chamar_gerador(nomes_a_evitar):
+    """
+    Faz uma chamada ao Gemini para gerar um personagem.
+    - Exceções da API são propagadas para quem chamou.
+    """
+    prompt_formatado = f"{PROMPT_GERADOR}{nomes_a_evitar or 'Nenhum'}"
+
+    response = get_client().models.generate_content(
+        model=MODELO,
+        contents=prompt_formatado,
+        config=CONFIG_PERSONAGEM,
+    )
+    registrar_uso(response)
+    # Lê e valida o JSON em uma única passada; um campo ausente ou inválido gera ValidationError
+    return Personagem.model_validate_json(response.text).model_dump()
+
+def chamar_gerador_lote(cliente, token_stats, nomes_a_evitar, quantidade):
+    """
+    Gera `quantidade` personagens em uma única chamada ao Gemini, com o schema `list[Personagem]`.
+    - Divide o custo de rede e de leitura do prompt entre vários jogos.
+    - Roda em segundo plano, por isso recebe o cliente e os contadores em vez de buscá-los no Streamlit.
+    - Exceções da API são propagadas para quem chamou.
+    """
+    prompt_formatado = f"{PROMPT_GERADOR}{nomes_a_evitar or 'Nenhum'}{PROMPT_LOTE.format(quantidade=quantidade)}"
+
+    response = cliente.models.generate_content(
+        model=MODELO,
+        contents=prompt_formatado,
+        config=CONFIG_POOL,
+    )
+    registrar_uso(response, token_stats)
+    return [personagem.model_dump() for personagem in LISTA_PERSONAGENS.validate_json(response.text)]
+
+def gerar_novo_personagem(nomes_a_evitar):
     """
     Chama a API do Gemini para gerar um novo personagem.
-    - Usa o modelo 'gemini-1.5-flash' para alta velocidade de resposta.
-    - Utiliza o cache do Streamlit para otimização.
+    - Usa o MODELO (gemini-2.5-flash), o mesmo do chat.
     - Inclui tratamento de erro para falhas na API.
     """
-    # Usar gemini-1.5-flash é ideal para aplicações de chat devido à sua baixa latência.
-    model = genai.GenerativeModel(model_name="gemini-2.5-flash")
-    
-    nomes_a_evitar = ", ".join(lista_a_evitar) if lista_a_evitar else "Nenhum"
-    prompt_formatado = PROMPT_GERADOR.format(lista_geracao=nomes_a_evitar)
-
     try:
-        response = model.generate_content(
-            prompt_formatado,
-            generation_config=genai.types.GenerationConfig(
-                response_mime_type='application/json',
-                response_schema=Personagem,
-            )
-        )
-        return json.loads(response.text)
+        return chamar_gerador(nomes_a_evitar)
     except Exception as e:
         st.error(f"Ocorreu um erro ao gerar o personagem: {e}")
         return None
 
+@st.cache_resource
+def get_executor():
+    """
+    Pool de threads do processo, usado para gerar personagens em segundo plano.
+    """
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="persona")
+
+def aquecer_conexao():
+    """
+    Faz uma chamada mínima (count_tokens, sem custo) em segundo plano, uma vez por sessão.
+    - Abre a conexão com a API enquanto o usuário lê a tela inicial; mantida por KEEPALIVE_CONEXAO,
+      ela já está pronta quando o primeiro personagem for gerado.
+    """
+    if "conexao_aquecida" not in st.session_state:
+        st.session_state.conexao_aquecida = get_executor().submit(
+            get_client().models.count_tokens, model=MODELO, contents="oi"
+        )
+
+def reabastecer_pool(quantidade=TAMANHO_POOL):
+    """
+    Dispara em segundo plano a geração de um lote de `quantidade` personagens.
+    - O lote fica em `pool_futuro` e só é aguardado quando um jogo precisar dele.
+    """
+    st.session_state.setdefault("persona_pool", [])
+    st.session_state.pool_futuro = get_executor().submit(
+        chamar_gerador_lote,
+        get_client(),
+        get_token_stats(),
+        st.session_state.personagens_usados_juntos,
+        quantidade,
+    )
+
+def obter_personagem():
+    """
+    Devolve o personagem do próximo jogo.
+    - Retira do pool gerado em segundo plano, descartando nomes repetidos.
+    - Com o pool vazio, chama a API na hora para um único personagem. Um lote ainda em andamento
+      não é aguardado (gerar vários personagens demora mais que um) e segue para os próximos jogos.
+    """
+    pool = st.session_state.setdefault("persona_pool", [])
+    futuro = st.session_state.get("pool_futuro")
+    with st.spinner("Gerando um novo personagem..."):
+        if futuro is not None and futuro.done():
+            del st.session_state.pool_futuro
+            try:
+                pool.extend(futuro.result())
+            except Exception:
+                logger.exception("Falha ao gerar o lote de personagens em segundo plano")
+        while pool:
+            personagem = pool.pop(0)
+            if personagem["personagem"] not in st.session_state.personagens_usados:
+                return personagem
+        return gerar_novo_personagem(st.session_state.personagens_usados_juntos)
+
+def criar_chat(dados_persona):
+    """
+    Cria a sessão de chat da persona.
+    - A persona e as regras vão na instrução de sistema, em uma configuração montada uma vez por jogo
+      e guardada na sessão, para que a compactação possa reabrir o chat com ela.
+    """
+    st.session_state.config_chat = types.GenerateContentConfig(
+        system_instruction=dados_persona,
+        max_output_tokens=MAX_TOKENS_CHAT,
+    )
+    return abrir_chat([])
+
+def abrir_chat(historico):
+    """
+    Abre uma sessão de chat do jogo atual com o histórico dado.
+    """
+    return get_client().chats.create(model=MODELO, config=st.session_state.config_chat, history=historico)
+
+def transmitir_resposta(prompt):
+    """
+    Envia a pergunta ao chat em modo streaming e devolve os trechos de texto à medida que chegam.
+    - Cada trecho devolve o controle ao Streamlit, que pode interromper o script se o usuário
+      interagir com outro widget, sem esperar a resposta completa.
+    """
+    chunk = None
+    for chunk in st.session_state.chat.send_message_stream(prompt):
+        # Trechos sem texto (ex.: bloqueados pelos filtros de segurança) têm text None
+        if chunk.text:
+            yield chunk.text
+    # O último trecho traz o usage_metadata com o total do turno
+    if chunk is not None:
+        registrar_uso(chunk)
+
+def texto_conteudo(conteudo):
+    """
+    Texto de uma mensagem do histórico, sem as partes que não são texto.
+    """
+    return "".join(parte.text for parte in conteudo.parts or [] if parte.text)
+
+def juntar_trechos(historico):
+    """
+    Une mensagens seguidas do mesmo papel em uma só.
+    - Uma resposta em streaming fica no histórico como uma mensagem por trecho recebido;
+      unidas, as mensagens voltam a alternar entre pergunta e resposta.
+    """
+    juntas = []
+    for conteudo in historico:
+        if juntas and juntas[-1].role == conteudo.role:
+            texto = texto_conteudo(juntas[-1]) + texto_conteudo(conteudo)
+            juntas[-1] = types.Content(role=conteudo.role, parts=[types.Part(text=texto)])
+        else:
+            juntas.append(conteudo)
+    return juntas
+
+def compactar_historico(chat):
+    """
+    Mantém limitado o histórico que o chat reenvia ao Gemini a cada turno.
+    - Acima de LIMITE_HISTORICO mensagens, resume as antigas em uma única nota de contexto
+      e mantém literais apenas as JANELA_HISTORICO mais recentes.
+    - Se o resumo falhar, o histórico fica como está e a compactação é tentada no próximo turno.
+    - Devolve o chat a usar daqui em diante: o mesmo, ou um novo com o histórico compactado.
+    """
+    historico = juntar_trechos(chat.get_history(curated=True))
+    if len(historico) <= LIMITE_HISTORICO:
+        return chat
+
+    antigas = historico[:-JANELA_HISTORICO]
+    recentes = historico[-JANELA_HISTORICO:]
+    transcricao = "\n".join(f"{conteudo.role}: {texto_conteudo(conteudo)}" for conteudo in antigas)
+    try:
+        resposta = get_client().models.generate_content(
+            model=MODELO,
+            contents=PROMPT_RESUMO + transcricao,
+            config=CONFIG_RESUMO,
+        )
+        registrar_uso(resposta)
+        resumo = resposta.text
+    except Exception:
+        return chat
+    if not resumo:
+        return chat
+
+    # O Chat do google-genai não permite trocar o histórico; cria outro com a mesma configuração
+    return abrir_chat([
+        types.UserContent(parts=f"Contexto anterior: {resumo}"),
+        types.ModelContent(parts="Entendido."),
+        *recentes,
+    ])
+
 def iniciar_novo_jogo():
     """
     Prepara o estado da sessão para um novo jogo.
     """
     st.session_state.mensagens = []
+    st.session_state.mensagens_formatadas = []
     
-    if 'personagens_usados' not in st.session_state:
-        st.session_state.personagens_usados = []
+    iniciar_personagens_usados()
 
-    novo_personagem = gerar_novo_personagem(st.session_state.personagens_usados)
-    
-    # Validação robusta para evitar erros (KeyError) se a API falhar
-    if novo_personagem and all(k in novo_personagem for k in ['personagem', 'descricao', 'estilo', 'saudacao']):
+    # Os geradores já validam a resposta contra o schema; None indica que a geração falhou
+    novo_personagem = obter_personagem()
+
+    if novo_personagem:
         st.session_state.personagem_secreto = novo_personagem
-        st.session_state.personagens_usados.append(novo_personagem['personagem'])
+        registrar_personagem_usado(novo_personagem['personagem'])
         
-        prompt_sistema = f"""
-        ### Contexto do Jogo
-        Você está interpretando uma persona secreta em um jogo de adivinhação.
-        - Identidade Secreta: {st.session_state.personagem_secreto['personagem']}
-        - Biografia (para sua consulta, não para recitar): {st.session_state.personagem_secreto['descricao']}
-        - Estilo de Comunicação: {st.session_state.personagem_secreto['estilo']}
-
-        ### Regras Cruciais
-        1. **NUNCA REVELE A IDENTIDADE**: Seja evasivo a perguntas diretas.
-        2. **DÊ PISTAS INDIRETAS**: Responda sempre sob a perspectiva da sua persona.
-        3. **SEJA O PERSONAGEM**: Incorpore a personalidade definida.
-        4. **GERENCIE PALPITES**: Se o usuário errar, negue sutilmente. Se acertar, confirme de forma criativa.
-        
-        **Comece o jogo APENAS com a sua saudação definida.**
-        """
-        
-        st.session_state.chat = genai.GenerativeModel(
-            model_name="gemini-2.5-flash",
-            system_instruction=prompt_sistema
-        ).start_chat(history=[])
+        dados_persona = PROMPT_PERSONA.format_map(st.session_state.personagem_secreto)
+        st.session_state.chat = criar_chat(dados_persona)
 
         saudacao_inicial = st.session_state.personagem_secreto['saudacao']
         st.session_state.mensagens.append({"role": "assistant", "content": saudacao_inicial})
+
+        # Com o pool vazio, já começa a gerar os próximos personagens enquanto este jogo acontece
+        if not st.session_state.persona_pool and "pool_futuro" not in st.session_state:
+            reabastecer_pool()
     else:
         st.error("Falha ao carregar o novo personagem. Por favor, tente iniciar um novo jogo.")
         if "mensagens" in st.session_state:
@@ -116,6 +392,42 @@ def iniciar_novo_jogo():
 
 # --- INTERFACE GRÁFICA DO STREAMLIT ---
 
+def formatar_mensagem(mensagem):
+    """
+    Texto em markdown de uma mensagem antiga, com o rótulo de quem a enviou.
+    - Todas as mensagens antigas dividem um único st.markdown. A formatação de linha (negrito,
+      itálico) é mantida; só o que vazaria para as seguintes é neutralizado: cerca de código aberta
+      é fechada, e títulos, tabelas e o $ do LaTeX do Streamlit são escapados.
+    """
+    conteudo = INICIO_BLOCO.sub(r"\1\\\2", mensagem["content"].replace("$", r"\$"))
+    cercas = CERCA_CODIGO.findall(conteudo)
+    if len(cercas) % 2:
+        conteudo += f"\n{cercas[-1]}"
+    return f"{ROTULOS[mensagem['role']]}\n\n{conteudo}"
+
+@st.fragment
+def render_chat():
+    """
+    Exibe o histórico de mensagens do jogo.
+    - Fica isolado em um fragmento; o st.chat_input fica fora dele para continuar fixo no rodapé.
+    - Só as MAX_MENSAGENS_EXIBIDAS mais recentes são desenhadas a cada rerun.
+    - As anteriores à última saem em um único st.markdown, em vez de um st.chat_message cada;
+      o markdown de cada mensagem é montado uma vez e guardado na sessão.
+    """
+    formatadas = st.session_state.setdefault("mensagens_formatadas", [])
+    formatadas.extend(formatar_mensagem(m) for m in st.session_state.mensagens[len(formatadas):])
+
+    ocultas = len(st.session_state.mensagens) - MAX_MENSAGENS_EXIBIDAS
+    if ocultas > 0:
+        st.caption(f"{ocultas} mensagens anteriores ocultas.")
+    # Sem unsafe_allow_html: o texto vem do jogador e do modelo
+    if anteriores := formatadas[-MAX_MENSAGENS_EXIBIDAS:-1]:
+        st.markdown("\n\n---\n\n".join(anteriores))
+    if st.session_state.mensagens:
+        ultima = st.session_state.mensagens[-1]
+        with st.chat_message(ultima["role"]):
+            st.markdown(ultima["content"])
+
 with st.sidebar:
     st.header("🕵️ Quem Sou Eu?")
     st.markdown("Adivinhe o personagem secreto fazendo perguntas!")
@@ -130,33 +442,61 @@ with st.sidebar:
     
     if "personagens_usados" in st.session_state and st.session_state.personagens_usados:
         with st.expander("Personagens já utilizados"):
-            for p in st.session_state.personagens_usados[:-1]:
-                st.write(f"- {p}")
+            # Um único elemento para a lista inteira, em vez de um st.write por personagem
+            st.markdown("\n".join(f"- {p}" for p in st.session_state.personagens_usados[:-1]))
 
 st.title("🕵️ Quem Sou Eu?")
 
 if "mensagens" in st.session_state:
-    for mensagem in st.session_state.mensagens:
-        with st.chat_message(mensagem["role"]):
-            st.markdown(mensagem["content"])
+    render_chat()
 
     if prompt := st.chat_input("Faça sua pergunta ou dê um palpite..."):
         st.session_state.mensagens.append({"role": "user", "content": prompt})
         with st.chat_message("user"):
             st.markdown(prompt)
 
-        with st.spinner("Pensando..."):
+        with st.chat_message("assistant"):
+            # O st.write_stream exibe cada trecho assim que chega e devolve o texto completo;
+            # em caso de erro, o placeholder troca a resposta parcial pela mensagem de erro
+            placeholder = st.empty()
             try:
-                # Tratamento de erro na resposta do chat para evitar crashes
-                resposta = st.session_state.chat.send_message(prompt)
-                response_text = resposta.text
+                with placeholder.container():
+                    response_text = st.write_stream(transmitir_resposta(prompt))
+            except errors.APIError as e:
+                erro = e.message
             except Exception as e:
-                response_text = f"Desculpe, ocorreu um erro ao processar sua pergunta. Tente novamente. (Erro: {e})"
-                st.error(response_text)
-            
-            st.session_state.mensagens.append({"role": "assistant", "content": response_text})
-            # Forçar o rerun após adicionar a mensagem da IA garante a atualização da tela
-            st.rerun()
+                erro = e
+            else:
+                if response_text:
+                    erro = None
+                else:
+                    # Nenhum trecho com texto: resposta bloqueada pelos filtros de segurança
+                    # ou interrompida pelo limite de tokens antes de qualquer texto
+                    erro = "o modelo não devolveu nenhum texto"
+
+            if erro is not None:
+                response_text = f"Desculpe, ocorreu um erro ao processar sua pergunta. Tente novamente. (Erro: {erro})"
+                # O chat só registra o turno quando o stream termina, então uma resposta
+                # interrompida não deixa nada no histórico
+                placeholder.error(response_text)
+            else:
+                st.session_state.chat = compactar_historico(st.session_state.chat)
+
+        # A resposta já foi exibida neste mesmo run; não é preciso um st.rerun() para atualizar a tela
+        st.session_state.mensagens.append({"role": "assistant", "content": response_text})
 
 else:
-    st.info("Clique em 'Iniciar Novo Jogo' na barra lateral para começar a diversão!")
\ No newline at end of file
+    st.info("Clique em 'Iniciar Novo Jogo' na barra lateral para começar a diversão!")
+    aquecer_conexao()
+
+# As estatísticas ficam no fim do script para já incluírem o turno processado neste run
+with st.sidebar:
+    lock, stats = get_token_stats()
+    with lock:
+        tokens = dict(stats)
+    if tokens["prompt"]:
+        st.metric(
+            "Tokens de entrada em cache",
+            f"{tokens['cached'] / tokens['prompt']:.0%}",
+            help=f"{tokens['cached']} de {tokens['prompt']} tokens de entrada desta sessão vieram do cache; {tokens['output']} tokens gerados.",
+        )